@@ -8,16 +8,18 @@ NOTES:
 
 All optional deps are sandboxed with try/except so the app runs even if some features are not installed/configured.
 
-Set environment variables before running: OPENAI_API_KEY=...   (for conversational NLU) ASSISTANT_WAKE_WORD (optional, default "hey atlas")
+Set environment variables before running: OPENAI_API_KEY=...   (for conversational NLU) ASSISTANT_WAKE_WORD (optional, default "hey atlas") ASSISTANT_VOSK_MODEL (optional; Vosk model name, default "vosk-model-small-en-us-0.15") ASSISTANT_WHISPER_MODEL (optional; faster-whisper size, default "small") ASSISTANT_STT_COMPUTE (optional; faster-whisper compute type, default "int8")
 
 
 """
 
-import os import sys import re import json import time import threading import sqlite3 import queue import platform import subprocess import logging import shutil from datetime import datetime, timedelta from urllib.parse import quote_plus
+import os import sys import re import json import stat import time import threading import asyncio import sqlite3 import queue import heapq import itertools import platform import subprocess import logging import shutil from datetime import datetime, timedelta from collections import deque from concurrent.futures import Future from functools import lru_cache from urllib.parse import quote_plus
 
 ---------- Optional dependencies (soft)
 
-try: import requests except Exception: requests = None
+try: import orjson  # C-accelerated JSON def _dumps(o): return orjson.dumps(o).decode() _loads = orjson.loads except Exception: _dumps = json.dumps _loads = json.loads
+
+try: import requests from requests.adapters import HTTPAdapter from urllib3.util.retry import Retry except Exception: requests = None
 
 try: from plyer import notification except Exception: notification = None
 
@@ -27,49 +29,93 @@ try: import pyperclip except Exception: pyperclip = None
 
 try: from watchdog.observers import Observer from watchdog.events import FileSystemEventHandler except Exception: Observer = None FileSystemEventHandler = object
 
-try: from playwright.sync_api import sync_playwright except Exception: sync_playwright = None
+try: from playwright.async_api import async_playwright except Exception: async_playwright = None
 
 try: import psutil except Exception: psutil = None
 
 try: import networkx as nx except Exception: nx = None
 
+try: from lxml import etree  # streaming RSS parse except Exception: etree = None
+
 try: import keyboard  # global hotkeys except Exception: keyboard = None
 
 try: import pyttsx3  # TTS except Exception: pyttsx3 = None
 
-Voice/STT (choose one; both optional)
+try: import numpy as np except Exception: np = None
+
+Voice/STT (choose one; both optional). CTranslate2 gets one thread per physical core via cpu_threads.
+
+_STT_THREADS = max(1, (psutil and psutil.cpu_count(logical=False)) or (os.cpu_count() or 2) // 2)
+
+try: import vosk, sounddevice as sd except Exception: vosk = None sd = None
 
-try: import vosk, sounddevice as sd, queue as sdqueue except Exception: vosk = None sd = None sdqueue = None
+try: from faster_whisper import WhisperModel from faster_whisper.vad import VadOptions, get_speech_timestamps except Exception: WhisperModel = None
 
 OpenAI (conversational NLU)
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") try: from openai import OpenAI _openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None except Exception: _openai_client = None
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") try: from openai import AsyncOpenAI _openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None except Exception: _openai_client = None
 
 ---------- Globals & setup
 
-APP_NAME = "Atlas Assistant" DB_PATH = os.path.join(os.path.dirname(file), "assistant.db") STATE = { "stop": False, "playwright": None, "browser": None, "page": None, "watchers": {}, "tts": None, } TASK_Q = queue.Queue() logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s: %(message)s")
+APP_NAME = "Atlas Assistant" DB_PATH = os.path.join(os.path.dirname(file), "assistant.db") STATE = { "stop": False, "playwright": None, "browser": None, "page": None, "watchers": {}, "tts": None, "speaking": False, } _POOL_N = min(4, os.cpu_count() or 1) _POOLS = [queue.SimpleQueue() for _ in range(_POOL_N)] _RR = itertools.count() _POOL_IDLE = deque() _POOL_WAKE = [threading.Semaphore(0) for _ in range(_POOL_N)] _LOOP = asyncio.new_event_loop() _NLU_SEM = asyncio.Semaphore(4) logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s: %(message)s")
+
+def _http_session(): if not requests: return None s = requests.Session() s.headers.update({"User-Agent": "atlas-assistant"}) a = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])) s.mount("https://", a); s.mount("http://", a) return s
+
+_SESSION = _http_session()
+
+---------- Task pool (one queue per worker, idle workers steal from peers, then sleep until submit() hands them a task)
+
+def submit(fn, *args, **kwargs): fut = Future() task = (fut, fn, args, kwargs) try: idx = _POOL_IDLE.popleft() except IndexError: _POOLS[next(_RR) % _POOL_N].put(task) else: _POOLS[idx].put(task) _POOL_WAKE[idx].release() return fut
+
+def _pool_steal(idx): for k in range(1, _POOL_N): try: return _POOLS[(idx + k) % _POOL_N].get_nowait() except queue.Empty: pass return None
+
+def _pool_worker(idx): own, wake = _POOLS[idx], _POOL_WAKE[idx] while True: try: task = own.get_nowait() except queue.Empty: task = _pool_steal(idx) if task is None: _POOL_IDLE.append(idx) try: task = own.get_nowait() except queue.Empty: wake.acquire() try: _POOL_IDLE.remove(idx) except ValueError: pass if task is None: continue fut, fn, args, kwargs = task if not fut.set_running_or_notify_cancel(): continue try: fut.set_result(fn(*args, **kwargs)) except BaseException as e: fut.set_exception(e)
+
+def start_workers(): for i in range(_POOL_N): threading.Thread(target=_pool_worker, args=(i,), daemon=True).start()
 
 ---------- Utilities
 
 def notify(title, message): if notification: try: notification.notify(title=title, message=message, timeout=6) except Exception: pass print(f" [NOTIFY] {title}: {message}")
 
-def tts_say(text: str): if not pyttsx3: return if not STATE["tts"]: try: STATE["tts"] = pyttsx3.init() except Exception: return try: STATE["tts"].say(text) STATE["tts"].runAndWait() except Exception: pass
+@lru_cache(maxsize=512) def _qp(s): return quote_plus(s)
+
+_TTS_Q = queue.Queue() _TTS_STOP = threading.Event()
+
+def _tts_worker(): try: STATE["tts"] = pyttsx3.init() STATE["tts"].startLoop(False) except Exception as e: logging.warning(f"TTS init failed: {e}") STATE["tts"] = None while True: text = _TTS_Q.get() _TTS_STOP.clear() if not STATE["tts"]: continue engine = STATE["tts"] try: STATE["speaking"] = True engine.say(text) engine.iterate() while engine.isBusy(): if _TTS_STOP.wait(0.02): engine.stop() break engine.iterate() except Exception: pass finally: STATE["speaking"] = False
+
+def tts_say(text: str): if not pyttsx3: return _TTS_Q.put(text)
+
+def tts_interrupt(): try: while True: _TTS_Q.get_nowait() except queue.Empty: pass _TTS_STOP.set()
 
 ---------- Persistence (SQLite)
 
-def db_init(): con = sqlite3.connect(DB_PATH) cur = con.cursor() cur.execute("CREATE TABLE IF NOT EXISTS reminders(id INTEGER PRIMARY KEY, text TEXT, due_at TEXT, repeat_rule TEXT)") cur.execute("CREATE TABLE IF NOT EXISTS logs(id INTEGER PRIMARY KEY, ts TEXT, kind TEXT, payload TEXT)") cur.execute("CREATE TABLE IF NOT EXISTS facts(key TEXT PRIMARY KEY, value TEXT)") cur.execute("CREATE TABLE IF NOT EXISTS habits(id INTEGER PRIMARY KEY, ts TEXT, action TEXT)") con.commit(); con.close()
+_tls = threading.local()
+
+def _conn(): if not hasattr(_tls, "c"): _tls.c = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None) _tls.c.executescript("PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY; PRAGMA cache_size=-20000;") return _tls.c
 
-def db_log(kind, payload): con = sqlite3.connect(DB_PATH) cur = con.cursor() cur.execute("INSERT INTO logs(ts, kind, payload) VALUES(?,?,?)", (datetime.now().isoformat(timespec='seconds'), kind, json.dumps(payload))) con.commit(); con.close()
+def db_init(): con = _conn() con.execute("CREATE TABLE IF NOT EXISTS reminders(id INTEGER PRIMARY KEY, text TEXT, due_at TEXT, repeat_rule TEXT)") con.execute("CREATE TABLE IF NOT EXISTS logs(id INTEGER PRIMARY KEY, ts TEXT, kind TEXT, payload TEXT)") con.execute("CREATE TABLE IF NOT EXISTS facts(key TEXT PRIMARY KEY, value TEXT)") con.execute("CREATE TABLE IF NOT EXISTS habits(id INTEGER PRIMARY KEY, ts TEXT, action TEXT)") con.execute("CREATE TABLE IF NOT EXISTS kg_edges(s TEXT, p TEXT, o TEXT, ts TEXT)") con.execute("CREATE INDEX IF NOT EXISTS idx_rem_due ON reminders(due_at)") con.execute("CREATE INDEX IF NOT EXISTS idx_habits_hour ON habits(substr(ts,12,2), action)") con.execute("CREATE INDEX IF NOT EXISTS idx_kg_s ON kg_edges(s)") con.execute("CREATE INDEX IF NOT EXISTS idx_kg_o ON kg_edges(o)") if psutil: psutil.cpu_percent(interval=None)
+
+_LOG_Q = queue.Queue()
+
+def _log_worker(): con = _conn() while True: first = _LOG_Q.get() if first is None: return batch = [first]; stop = False; deadline = time.time() + 0.1 while len(batch) < 32: try: row = _LOG_Q.get(timeout=max(0, deadline - time.time())) except queue.Empty: break if row is None: stop = True; break batch.append(row) try: con.execute("BEGIN") con.executemany("INSERT INTO logs(ts, kind, payload) VALUES(?,?,?)", batch) con.execute("COMMIT") except Exception: if con.in_transaction: con.execute("ROLLBACK") if stop: return
+
+def db_log(kind, payload): _LOG_Q.put((datetime.now().isoformat(timespec='seconds'), kind, _dumps(payload)))
 
 ---------- Reminders & Alarms
 
-def add_reminder(text, due_at, repeat_rule=None): con = sqlite3.connect(DB_PATH) cur = con.cursor() cur.execute("INSERT INTO reminders(text, due_at, repeat_rule) VALUES(?,?,?)", (text, due_at, repeat_rule)) con.commit(); con.close()
+_REM_HEAP = [] _REM_COND = threading.Condition()
+
+def _due_epoch(due_at): try: return datetime.fromisoformat(due_at).timestamp() except Exception: return None
+
+def _push_reminder(rid, due_at): due = _due_epoch(due_at) if due is None: return with _REM_COND: heapq.heappush(_REM_HEAP, (due, rid)) _REM_COND.notify()
 
-def list_reminders(): con = sqlite3.connect(DB_PATH) cur = con.cursor() cur.execute("SELECT id, text, due_at, repeat_rule FROM reminders ORDER BY due_at ASC") rows = cur.fetchall(); con.close(); return rows
+def add_reminder(text, due_at, repeat_rule=None): rid = _conn().execute("INSERT INTO reminders(text, due_at, repeat_rule) VALUES(?,?,?)", (text, due_at, repeat_rule)).lastrowid _push_reminder(rid, due_at)
 
-def delete_reminder(rid): con = sqlite3.connect(DB_PATH) cur = con.cursor() cur.execute("DELETE FROM reminders WHERE id=?", (rid,)) con.commit(); con.close()
+def list_reminders(): return _conn().execute("SELECT id, text, due_at, repeat_rule FROM reminders ORDER BY due_at ASC").fetchall()
 
-def scheduler_loop(): while not STATE["stop"]: try: now = datetime.now() con = sqlite3.connect(DB_PATH) cur = con.cursor() cur.execute("SELECT id, text, due_at, repeat_rule FROM reminders") rows = cur.fetchall(); con.close() for rid, text, due_at, repeat_rule in rows: try: dt = datetime.fromisoformat(due_at) except Exception: continue if now >= dt: notify("Reminder", text) tts_say(f"Reminder: {text}") if repeat_rule: if repeat_rule == "daily": nxt = dt + timedelta(days=1) elif repeat_rule == "hourly": nxt = dt + timedelta(hours=1) elif repeat_rule == "weekly": nxt = dt + timedelta(weeks=1) else: nxt = None if nxt: con = sqlite3.connect(DB_PATH) cur = con.cursor() cur.execute("UPDATE reminders SET due_at=? WHERE id=?", (nxt.isoformat(timespec='minutes'), rid)) con.commit(); con.close(); continue delete_reminder(rid) except Exception: pass time.sleep(10)
+def delete_reminder(rid): _conn().execute("DELETE FROM reminders WHERE id=?", (rid,)) with _REM_COND: _REM_HEAP[:] = [e for e in _REM_HEAP if e[1] != rid] heapq.heapify(_REM_HEAP) _REM_COND.notify()
+
+def scheduler_loop(): con = _conn() with _REM_COND: _REM_HEAP[:] = [] for rid, due_at in con.execute("SELECT id, due_at FROM reminders").fetchall(): _push_reminder(rid, due_at) while not STATE["stop"]: with _REM_COND: wait = _REM_HEAP[0][0] - time.time() if _REM_HEAP else None _REM_COND.wait(timeout=wait) now = time.time() fired = [] while _REM_HEAP and _REM_HEAP[0][0] <= now: fired.append(heapq.heappop(_REM_HEAP)) to_update, to_delete, to_push = [], [], [] for due, rid in fired: try: row = con.execute("SELECT text, repeat_rule FROM reminders WHERE id=?", (rid,)).fetchone() if not row: continue text, repeat_rule = row notify("Reminder", text) tts_say(f"Reminder: {text}") dt = datetime.fromtimestamp(due) if repeat_rule: if repeat_rule == "daily": nxt = dt + timedelta(days=1) elif repeat_rule == "hourly": nxt = dt + timedelta(hours=1) elif repeat_rule == "weekly": nxt = dt + timedelta(weeks=1) else: nxt = None if nxt: step = nxt - dt while nxt.timestamp() <= now: nxt += step to_update.append((nxt.isoformat(timespec='minutes'), rid)) to_push.append((nxt.timestamp(), rid)) continue to_delete.append((rid,)) except Exception: pass if to_push: with _REM_COND: for entry in to_push: heapq.heappush(_REM_HEAP, entry) if not (to_update or to_delete): continue try: con.execute("BEGIN IMMEDIATE") con.executemany("UPDATE reminders SET due_at=? WHERE id=?", to_update) con.executemany("DELETE FROM reminders WHERE id=?", to_delete) con.execute("COMMIT") except Exception: if con.in_transaction: con.execute("ROLLBACK")
 
 ---------- Clipboard & Files
 
@@ -79,63 +125,111 @@ def get_clipboard(): if not pyperclip: return None try: return pyperclip.paste()
 
 def move_file(src, dst): try: os.makedirs(os.path.dirname(dst), exist_ok=True) shutil.move(src, dst); return "ok" except Exception as e: return f"failed: {e}"
 
-def delete_path(p): try: if os.path.isdir(p): shutil.rmtree(p) elif os.path.isfile(p): os.remove(p) else: return "not found" return "ok" except Exception as e: return f"failed: {e}"
+def _remove_tree(p): with os.scandir(p) as it: entries = list(it) if any(e.is_dir(follow_symlinks=False) for e in entries): return shutil.rmtree(p) for e in entries: os.unlink(e.path) os.rmdir(p)
+
+def delete_path(p): try: try: mode = os.lstat(p).st_mode except FileNotFoundError: return "not found" if stat.S_ISDIR(mode): _remove_tree(p) else: os.remove(p) return "ok" except Exception as e: return f"failed: {e}"
+
+---------- Folder watch (watchdog, native backend, 100 ms debounce)
+
+def _native_observer(): try: if platform.system()=="Linux": from watchdog.observers.inotify import InotifyObserver as ObserverCls elif platform.system()=="Darwin": from watchdog.observers.fsevents import FSEventsObserver as ObserverCls elif platform.system()=="Windows": from watchdog.observers.read_directory_changes import WindowsApiObserver as ObserverCls else: ObserverCls = Observer except Exception: ObserverCls = Observer return ObserverCls()
+
+def _scan_files(path): with os.scandir(path) as it: for e in it: if e.is_dir(follow_symlinks=False): yield from _scan_files(e.path) elif e.is_file(follow_symlinks=False): yield e.path
+
+class DebouncedHandler(FileSystemEventHandler): def init(self, callback, delay=0.1): super().init() self.callback = callback self.delay = delay self.pending = {} self.lock = threading.Lock() self.timer = None def _merge(self, path, kind): prev = self.pending.get(path) if prev == "created" and kind == "deleted": del self.pending[path] elif prev != "created" or kind != "modified": self.pending[path] = kind def on_any_event(self, event): kind = event.event_type if kind not in ("created", "modified", "deleted", "moved") or (event.is_directory and kind == "modified"): return path = getattr(event, "dest_path", "") or event.src_path with self.lock: if kind == "moved": self._merge(event.src_path, "deleted") self._merge(path, kind) if event.is_directory and kind in ("created", "moved") and os.path.isdir(path): try: for f in _scan_files(path): self._merge(f, "created") except OSError: pass if not self.timer: self.timer = threading.Timer(self.delay, self._flush) self.timer.daemon = True self.timer.start() def _flush(self): with self.lock: batch, self.pending, self.timer = self.pending, {}, None if not batch: return try: self.callback([(kind, path) for path, kind in batch.items()]) except Exception as e: logging.warning(f"watch callback error: {e}")
+
+def _on_folder_events(events): for kind, path in events: db_log("watch", {"event": kind, "path": path}) notify(APP_NAME, f"{events[0][0]}: {events[0][1]}" if len(events) == 1 else f"{len(events)} changes in watched folders")
+
+def watch_folder(path, callback=None): if not Observer: return "watchdog not installed" path = os.path.abspath(path) if path in STATE["watchers"]: return "already watching" if not os.path.isdir(path): return "not found" obs = _native_observer() obs.schedule(DebouncedHandler(callback or _on_folder_events), path, recursive=True) obs.start() STATE["watchers"][path] = obs return "ok"
+
+def unwatch_folder(path): obs = STATE["watchers"].pop(os.path.abspath(path), None) if not obs: return "not watching" obs.stop(); return "ok"
 
 ---------- Monitoring (psutil)
 
-def get_system_stats(): if not psutil: return {"error":"psutil not installed"} try: return { "cpu_percent": psutil.cpu_percent(interval=0.5), "mem_percent": psutil.virtual_memory().percent, "disk_percent": psutil.disk_usage("/").percent if platform.system()!="Windows" else psutil.disk_usage("C:/").percent, "battery_percent": (psutil.sensors_battery().percent if hasattr(psutil, 'sensors_battery') and psutil.sensors_battery() else None), } except Exception as e: return {"error": str(e)}
+def _ttl_cache(seconds): def deco(fn): box = [] def wrapper(): if not box or time.time() - box[0] >= seconds: box[:] = [time.time(), fn()] return box[1] return wrapper return deco
+
+@_ttl_cache(10) def _disk_percent(): return psutil.disk_usage("/").percent if platform.system()!="Windows" else psutil.disk_usage("C:/").percent
+
+@_ttl_cache(30) def _battery_percent(): bat = psutil.sensors_battery() if hasattr(psutil, 'sensors_battery') else None return bat.percent if bat else None
+
+def get_system_stats(): if not psutil: return {"error":"psutil not installed"} try: return { "cpu_percent": psutil.cpu_percent(interval=None), "mem_percent": psutil.virtual_memory().percent, "disk_percent": _disk_percent(), "battery_percent": _battery_percent(), } except Exception as e: return {"error": str(e)}
 
 ---------- Multi-desktop / Windowing (best-effort cross-platform)
 
 def switch_desktop(idx: int): try: if platform.system()=="Linux": # requires wmctrl subprocess.Popen(["wmctrl", "-s", str(idx)]) return "ok" elif platform.system()=="Darwin": script = f'tell application "System Events" to key code 18 using control down'  # Ctrl+1 as example subprocess.run(["osascript", "-e", script]) return "ok" elif platform.system()=="Windows": # No stdlib way; recommend third-party libs. We'll provide a message. return "windows multi-desktop control requires additional tools" except Exception as e: return f"failed: {e}"
 
-def send_hotkeys(*keys): if not pyautogui: return "pyautogui not installed" try: pyautogui.hotkey(*keys); return "ok" except Exception as e: return f"failed: {e}"
+_VK = {"ctrl": 0x11, "control": 0x11, "shift": 0x10, "alt": 0x12, "win": 0x5B, "winleft": 0x5B, "tab": 0x09, "enter": 0x0D, "return": 0x0D, "esc": 0x1B, "escape": 0x1B, "space": 0x20, "backspace": 0x08, "delete": 0x2E, "del": 0x2E, "insert": 0x2D, "home": 0x24, "end": 0x23, "pageup": 0x21, "pagedown": 0x22, "left": 0x25, "up": 0x26, "right": 0x27, "down": 0x28, **{f"f{i}": 0x6F + i for i in range(1, 13)}}
+
+_VK_EXTENDED = frozenset((0x21, 0x22, 0x23, 0x24, 0x25, 0x26, 0x27, 0x28, 0x2D, 0x2E))
+
+if platform.system()=="Windows": import ctypes from ctypes import wintypes class _KEYBDINPUT(ctypes.Structure): _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t)] class _MOUSEINPUT(ctypes.Structure): _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD), ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t)] class _INPUTUNION(ctypes.Union): _fields_ = [("ki", _KEYBDINPUT), ("mi", _MOUSEINPUT)] class _INPUT(ctypes.Structure): _fields_ = [("type", wintypes.DWORD), ("u", _INPUTUNION)]
+
+def _send_input_hotkey(keys): vks = [_VK.get(k.lower()) or (ord(k.upper()) if len(k) == 1 and k.isascii() and k.isalnum() else None) for k in keys] if not vks or None in vks: return False n = 2 * len(vks) arr = (_INPUT * n)() for i, vk in enumerate(vks): down, up = arr[i], arr[n - 1 - i] down.type = up.type = 1 down.u.ki.wVk = up.u.ki.wVk = vk ext = 0x0001 if vk in _VK_EXTENDED else 0 down.u.ki.dwFlags = ext up.u.ki.dwFlags = ext | 0x0002 return ctypes.windll.user32.SendInput(n, arr, ctypes.sizeof(_INPUT)) == n
+
+def send_hotkeys(*keys): if platform.system()=="Windows": try: if _send_input_hotkey(keys): return "ok" except Exception: pass if not pyautogui: return "pyautogui not installed" try: pyautogui.hotkey(*keys); return "ok" except Exception as e: return f"failed: {e}"
 
 ---------- Web automation (Playwright)
 
-def ensure_browser(): if not sync_playwright: return "playwright not installed" if not STATE["playwright"]: STATE["playwright"] = sync_playwright().start() STATE["browser"] = STATE["playwright"].chromium.launch(headless=False) STATE["page"] = STATE["browser"].new_page() return None
+PW_PROFILE = os.path.join(os.path.dirname(file), ".pw-profile") _PW_LOCK = asyncio.Lock()
+
+def _run_async(coro, timeout=60): return asyncio.run_coroutine_threadsafe(coro, _LOOP).result(timeout)
+
+async def ensure_browser(): if not async_playwright: return "playwright not installed" async with _PW_LOCK: if not STATE["playwright"]: STATE["playwright"] = await async_playwright().start() STATE["browser"] = await STATE["playwright"].chromium.launch_persistent_context(user_data_dir=PW_PROFILE, headless=False) STATE["page"] = STATE["browser"].pages[0] if STATE["browser"].pages else await STATE["browser"].new_page() return None
+
+async def close_browser(): if STATE["browser"]: try: await STATE["browser"].close() except Exception: pass if STATE["playwright"]: try: await STATE["playwright"].stop() except Exception: pass
+
+async def _web_open(url): err = await ensure_browser() if err: return err await STATE["page"].goto(url) return "ok"
+
+async def _web_type(selector, text): if not STATE.get("page"): return "no page" await STATE["page"].fill(selector, text); return "ok"
 
-def web_open(url): err = ensure_browser(); if err: return err STATE["page"].goto(url) return "ok"
+async def _web_click(selector): if not STATE.get("page"): return "no page" await STATE["page"].click(selector); return "ok"
 
-def web_type(selector, text): if not STATE.get("page"): return "no page" STATE["page"].fill(selector, text); return "ok"
+def web_open(url): return _run_async(_web_open(url))
 
-def web_click(selector): if not STATE.get("page"): return "no page" STATE["page"].click(selector); return "ok"
+def web_type(selector, text): return _run_async(_web_type(selector, text))
+
+def web_click(selector): return _run_async(_web_click(selector))
 
 ---------- Maps/Time/Weather (no key)
 
-def get_public_ip_location(): if not requests: return (None, None, None) try: r = requests.get("https://ipinfo.io/json", timeout=5) j = r.json(); if "loc" in j: lat, lon = j["loc"].split(","); return float(lat), float(lon), j.get("city") except Exception: pass return (None, None, None)
+def get_public_ip_location(): if not requests: return (None, None, None) try: r = _SESSION.get("https://ipinfo.io/json", timeout=5) j = r.json(); if "loc" in j: lat, lon = j["loc"].split(","); return float(lat), float(lon), j.get("city") except Exception: pass return (None, None, None)
+
+def geocode_city(city): if not requests: return (None, None, None) try: r = _SESSION.get("https://nominatim.openstreetmap.org/search", params={"q": city, "format":"json", "limit": 1}, timeout=10) arr = r.json() if arr: return float(arr[0]["lat"]), float(arr[0]["lon"]), arr[0].get("display_name") except Exception: pass return (None, None, None)
+
+@lru_cache(maxsize=256) def _geocode_city_cached(city): lat, lon, disp = geocode_city(city) if lat is None: raise LookupError(city) return lat, lon, disp
+
+_IP_LOC = None  # (ts, lat, lon, city)
 
-def geocode_city(city): if not requests: return (None, None, None) try: r = requests.get("https://nominatim.openstreetmap.org/search", params={"q": city, "format":"json", "limit": 1}, headers={"User-Agent":"atlas-assistant"}, timeout=10) arr = r.json() if arr: return float(arr[0]["lat"]), float(arr[0]["lon"]), arr[0].get("display_name") except Exception: pass return (None, None, None)
+def _ip_location_cached(): global _IP_LOC if _IP_LOC and time.time() - _IP_LOC[0] < 3600: return _IP_LOC[1:] loc = get_public_ip_location() if loc[0] is not None: _IP_LOC = (time.time(),) + loc return loc
 
-def weather_by_coords(lat, lon): if not requests: return None try: url = "https://api.open-meteo.com/v1/forecast" params = {"latitude": lat, "longitude": lon, "current_weather": True} j = requests.get(url, params=params, timeout=10).json() cw = j.get("current_weather") if cw: return {"temperature_c": cw.get("temperature"), "wind_kmh": cw.get("windspeed"), "code": cw.get("weathercode")} except Exception: pass return None
+def weather_by_coords(lat, lon): if not requests: return None try: url = "https://api.open-meteo.com/v1/forecast" params = {"latitude": lat, "longitude": lon, "current_weather": True} j = _SESSION.get(url, params=params, timeout=10).json() cw = j.get("current_weather") if cw: return {"temperature_c": cw.get("temperature"), "wind_kmh": cw.get("windspeed"), "code": cw.get("weathercode")} except Exception: pass return None
 
 def open_url(url): try: if platform.system()=="Windows": os.startfile(url) elif platform.system()=="Darwin": subprocess.Popen(["open", url]) else: subprocess.Popen(["xdg-open", url]) except Exception: pass
 
----------- Knowledge Graph (optional networkx)
+---------- Knowledge Graph (SQLite edges, optional networkx view)
 
-class Knowledge: def init(self, path): self.path = path self.g = nx.Graph() if nx else None self._load() def _load(self): if not nx: return if os.path.isfile(self.path): try: data = json.load(open(self.path, "r", encoding="utf-8")) self.g = nx.node_link_graph(data) except Exception: self.g = nx.Graph() def _save(self): if not nx: return data = nx.node_link_data(self.g) json.dump(data, open(self.path, "w", encoding="utf-8")) def add_fact(self, subject, predicate, obj): if not nx: return "networkx not installed" self.g.add_node(subject); self.g.add_node(obj) self.g.add_edge(subject, obj, predicate=predicate, ts=datetime.now().isoformat(timespec='seconds')) self._save(); return "ok" def query(self, subject): if not nx: return [] if subject not in self.g: return [] res = [] for n in self.g.neighbors(subject): pred = self.g.get_edge_data(subject, n).get("predicate") res.append({"subject": subject, "predicate": pred, "object": n}) return res
+class Knowledge: def init(self, path): self.path = path self._g = None def load(self): con = _conn() if not os.path.isfile(self.path) or con.execute("SELECT 1 FROM kg_edges LIMIT 1").fetchone(): return try: with open(self.path, "rb") as f: data = _loads(f.read()) rows = [(e["source"], e.get("predicate"), e["target"], e.get("ts")) for e in data.get("links") or data.get("edges") or []] con.execute("BEGIN") con.executemany("INSERT INTO kg_edges(s, p, o, ts) VALUES(?,?,?,?)", rows) con.execute("COMMIT") except Exception: if con.in_transaction: con.execute("ROLLBACK") def add_fact(self, subject, predicate, obj): _conn().execute("INSERT INTO kg_edges(s, p, o, ts) VALUES(?,?,?,?)", (subject, predicate, obj, datetime.now().isoformat(timespec='seconds'))) self._g = None return "ok" def query(self, subject): rows = _conn().execute("SELECT p, o FROM kg_edges WHERE s=? UNION SELECT p, s FROM kg_edges WHERE o=?", (subject, subject)).fetchall() return [{"subject": subject, "predicate": p, "object": o} for p, o in rows] def graph(self): if not nx: return None if self._g is None: self._g = nx.Graph() for s, p, o, ts in _conn().execute("SELECT s, p, o, ts FROM kg_edges"): self._g.add_edge(s, o, predicate=p, ts=ts) return self._g
 
 KNOWLEDGE = Knowledge(os.path.join(os.path.dirname(file), "knowledge.json"))
 
 ---------- Habits (very simple model)
 
-def record_habit(action): con = sqlite3.connect(DB_PATH) cur = con.cursor() cur.execute("INSERT INTO habits(ts, action) VALUES(?, ?)", (datetime.now().isoformat(timespec='seconds'), action)) con.commit(); con.close()
+def record_habit(action): _conn().execute("INSERT INTO habits(ts, action) VALUES(?, ?)", (datetime.now().isoformat(timespec='seconds'), action))
 
-def suggest_actions_now(limit=3): con = sqlite3.connect(DB_PATH) cur = con.cursor() hour = datetime.now().hour cur.execute("SELECT action, COUNT(*) c FROM habits WHERE CAST(substr(ts,12,2) AS INTEGER)=? GROUP BY action ORDER BY c DESC LIMIT ?", (hour, limit)) rows = cur.fetchall(); con.close() return [a for a,_ in rows]
+def suggest_actions_now(limit=3): hour = f"{datetime.now().hour:02d}" rows = _conn().execute("SELECT action, COUNT(*) c FROM habits WHERE substr(ts,12,2)=? GROUP BY action ORDER BY c DESC LIMIT ?", (hour, limit)).fetchall() return [a for a,_ in rows]
 
 ---------- Internet power (stubs with graceful fallback)
 
-def web_search(query): if not requests: open_url(f"https://duckduckgo.com/?q={quote_plus(query)}"); return ["opened browser for search"] try: # Use duckduckgo html as a simple fallback (not guaranteed stable) url = "https://duckduckgo.com/html/" r = requests.post(url, data={"q": query}, timeout=10, headers={"User-Agent":"atlas-assistant"}) if r.status_code==200: return [f"Top results page opened in browser"], open_url(f"https://duckduckgo.com/?q={quote_plus(query)}") except Exception: pass open_url(f"https://duckduckgo.com/?q={quote_plus(query)}"); return ["opened browser for search"]
+def web_search(query): open_url(f"https://duckduckgo.com/?q={_qp(query)}"); return ["opened browser for search"]
 
 def gmail_send_email(*args, **kwargs): return "gmail not configured; integrate Google API creds first"
 
 def calendar_create_event(*args, **kwargs): return "calendar not configured; integrate Google Calendar API first"
 
-def fetch_rss(url): if not requests: return [] try: import xml.etree.ElementTree as ET txt = requests.get(url, timeout=10).text root = ET.fromstring(txt) items = [] for item in root.iter('item'): title = item.findtext('title') link = item.findtext('link') items.append({"title": title, "link": link}) return items[:10] except Exception: return []
+def fetch_rss(url): if not requests: return [] items = [] try: with _SESSION.get(url, timeout=10, stream=True) as r: r.raw.decode_content = True if etree: events = etree.iterparse(r.raw, events=("end",), tag="item", resolve_entities=False, no_network=True, huge_tree=False) else: import xml.etree.ElementTree as ET events = ET.iterparse(r.raw, events=("end",)) for _, el in events: if el.tag != "item": continue items.append({"title": el.findtext("title"), "link": el.findtext("link")}) el.clear() if len(items) >= 10: break return items except Exception: return items
 
-def translate_text(text, target_lang="en"): # no external key; use web browser fallback open_url(f"https://translate.google.com/?sl=auto&tl={quote_plus(target_lang)}&text={quote_plus(text)}"); return "opened translator"
+def translate_text(text, target_lang="en"): # no external key; use web browser fallback open_url(f"https://translate.google.com/?sl=auto&tl={_qp(target_lang)}&text={_qp(text)}"); return "opened translator"
 
-def dictionary_lookup(word): open_url(f"https://www.lexico.com/en/definition/{quote_plus(word)}"); return "opened dictionary"
+def dictionary_lookup(word): open_url(f"https://www.lexico.com/en/definition/{_qp(word)}"); return "opened dictionary"
 
 ---------- Command registry (actions the planner can call)
 
@@ -143,7 +237,7 @@ def action_open_app(name): try: if platform.system()=="Windows": os.startfile(na
 
 def action_open_url(url): open_url(url); record_habit("open_url"); return f"Opened {url}"
 
-def action_weather(city=None): if city: lat, lon, disp = geocode_city(city) else: lat, lon, disp = get_public_ip_location() if not lat: return "Couldn't resolve location" data = weather_by_coords(lat, lon) if not data: return "Weather unavailable" return f"Weather @ {disp or f'{lat:.3f},{lon:.3f}'}: {data['temperature_c']}°C, wind {data['wind_kmh']} km/h"
+def action_weather(city=None): if city: try: lat, lon, disp = _geocode_city_cached(city.strip().lower()) except LookupError: lat, lon, disp = (None, None, None) else: lat, lon, disp = _ip_location_cached() if not lat: return "Couldn't resolve location" data = weather_by_coords(lat, lon) if not data: return "Weather unavailable" return f"Weather @ {disp or f'{lat:.3f},{lon:.3f}'}: {data['temperature_c']}°C, wind {data['wind_kmh']} km/h"
 
 def action_set_reminder(text, due_iso, repeat=None): add_reminder(text, due_iso, repeat) return f"Reminder set for {due_iso}"
 
@@ -157,27 +251,67 @@ def action_file_move(src, dst): return move_file(src, dst)
 
 def action_file_delete(path): return delete_path(path)
 
+def action_watch_folder(path): return watch_folder(path)
+
+def action_unwatch_folder(path): return unwatch_folder(path)
+
 def action_search(query): web_search(query); return f"Searching for {query}"
 
 def action_switch_desktop(idx): return switch_desktop(idx)
 
-def action_hotkeys(keys_csv): keys = [k.strip() for k in keys_csv.split(',')] return send_hotkeys(*keys)
+def action_hotkeys(keys_csv): return send_hotkeys(*(k.strip() for k in keys_csv.split(',')))
 
-ACTIONS = { "open_app": action_open_app, "open_url": action_open_url, "weather": action_weather, "set_reminder": action_set_reminder, "system_stats": action_system_stats, "clipboard_set": action_clipboard_set, "clipboard_get": action_clipboard_get, "file_move": action_file_move, "file_delete": action_file_delete, "search": action_search, "switch_desktop": action_switch_desktop, "hotkeys": action_hotkeys, }
+ACTIONS = { "open_app": action_open_app, "open_url": action_open_url, "weather": action_weather, "set_reminder": action_set_reminder, "system_stats": action_system_stats, "clipboard_set": action_clipboard_set, "clipboard_get": action_clipboard_get, "file_move": action_file_move, "file_delete": action_file_delete, "watch_folder": action_watch_folder, "unwatch_folder": action_unwatch_folder, "search": action_search, "switch_desktop": action_switch_desktop, "hotkeys": action_hotkeys, }
 
 ---------- Natural Language Understanding (OpenAI planner)
 
-SYSTEM_PROMPT = ( "You are an assistant that converts user requests into a short response plus a JSON action plan. " "If an action is needed, respond with a JSON object under 'action' containing 'name' and 'args'. " "Valid actions: " + ", ".join(ACTIONS.keys()) + ". " "If setting a reminder, compute an ISO datetime if the user says times like 'in 30 minutes'. " )
+SYSTEM_PROMPT = ( "You are an assistant that converts user requests into a short spoken response plus an optional action. " "Write the response as plain sentences first. " "If an action is needed, end with a final line 'ACTION: ' followed by a JSON object containing 'name' and 'args'. " "Valid actions: " + ", ".join(ACTIONS.keys()) + ". " "If setting a reminder, compute an ISO datetime if the user says times like 'in 30 minutes'. " )
+
+_ACTION_TAG = "ACTION:" _SENT_RE = re.compile(r"[.!?](?=\s)") _ABBREV_RE = re.compile(r"\b(?:Mr|Mrs|Ms|Dr|St)\.$")
+
+def _take_sentences(text, min_len=10): out = []; start = 0 for m in _SENT_RE.finditer(text): chunk = text[start:m.end()].strip() if len(chunk) < min_len or _ABBREV_RE.search(chunk): continue out.append(chunk); start = m.end() return out, start
 
-def plan_with_openai(user_text: str): if not _openai_client: return {"reply": "(OpenAI not configured) " + user_text, "action": None} try: messages = [ {"role":"system","content": SYSTEM_PROMPT}, {"role":"user","content": user_text}, ] resp = _openai_client.chat.completions.create( model="gpt-4o-mini", messages=messages, temperature=0.2, response_format={"type":"json_object"} ) j = json.loads(resp.choices[0].message.content) return {"reply": j.get("reply") or "", "action": j.get("action")} except Exception as e: return {"reply": f"NLU error: {e}", "action": None}
+def _parse_action(tail): tail = tail[tail.find("{"):tail.rfind("}") + 1] try: return _loads(tail) if tail else None except ValueError: return None
 
----------- Voice: hotkey to start listening (vosk)
+BATCH_PROMPT = ( "You are an assistant that converts each numbered user request into a short spoken response plus an optional action. " "Respond with a JSON object {\"plans\": [...]} holding one {\"reply\": ..., \"action\": ...} object per request, in order. " "'action' is null or an object containing 'name' and 'args'. " "Valid actions: " + ", ".join(ACTIONS.keys()) + ". " "If setting a reminder, compute an ISO datetime if the user says times like 'in 30 minutes'. " )
 
-class VoskListener(threading.Thread): def init(self, wake_word="hey atlas"): super().init(daemon=True) self.wake = wake_word.lower() self.active = False def run(self): if not vosk or not sd: logging.info("Vosk not available; voice disabled") return try: model = vosk.Model(lang="en-us") q = sdqueue.Queue() def cb(indata, frames, time_, status): q.put(bytes(indata)) with sd.RawInputStream(samplerate=16000, blocksize=8000, dtype='int16', channels=1, callback=cb): rec = vosk.KaldiRecognizer(model, 16000) logging.info("Voice listener ready") while not STATE["stop"]: data = q.get() if rec.AcceptWaveform(data): text = json.loads(rec.Result()).get("text", "").lower() if not text: continue if not self.active: if self.wake in text: notify(APP_NAME, "Listening...") self.active = True else: handle_user_text(text) self.active = False else: pass except Exception as e: logging.warning(f"Vosk error: {e}")
+_NLU_CACHE = {} _NLU_TTL = 300
+
+def _nlu_key(text): return " ".join(text.lower().split())
+
+def _nlu_cached(key): hit = _NLU_CACHE.get(key) return dict(hit[1]) if hit and time.time() - hit[0] < _NLU_TTL else None
+
+_NLU_NO_CACHE = ("set_reminder",)
+
+def _nlu_remember(key, plan): action = plan["action"] if isinstance(plan["action"], dict) else {} if action.get("name") in _NLU_NO_CACHE: return now = time.time() if len(_NLU_CACHE) >= 256: for k in [k for k, (ts, _) in _NLU_CACHE.items() if now - ts >= _NLU_TTL]: del _NLU_CACHE[k] _NLU_CACHE[key] = (now, {"reply": plan["reply"], "action": plan["action"]})
+
+async def plan_with_openai(user_text: str, on_sentence=None): if not _openai_client: return {"reply": "(OpenAI not configured) " + user_text, "action": None} key = _nlu_key(user_text) cached = _nlu_cached(key) if cached: return cached try: messages = [ {"role":"system","content": SYSTEM_PROMPT}, {"role":"user","content": user_text}, ] async with _NLU_SEM: stream = await _openai_client.chat.completions.create( model="gpt-4o-mini", messages=messages, temperature=0.2, stream=True ) text = ""; spoken = 0 async for chunk in stream: if not chunk.choices: continue text += chunk.choices[0].delta.content or "" if on_sentence: sentences, n = _take_sentences(text.split(_ACTION_TAG, 1)[0][spoken:]) for s in sentences: on_sentence(s) spoken += n reply, _, tail = text.partition(_ACTION_TAG) if on_sentence and reply[spoken:].strip(): on_sentence(reply[spoken:].strip()) plan = {"reply": reply.strip(), "action": _parse_action(tail)} if plan["action"] is not None or not tail.strip(): _nlu_remember(key, plan) return dict(plan, spoken=bool(on_sentence)) except Exception as e: return {"reply": f"NLU error: {e}", "action": None}
+
+async def plan_batch_with_openai(texts): if not _openai_client: return [{"reply": "(OpenAI not configured) " + t, "action": None} for t in texts] plans = {}; todo = {} for t in texts: k = _nlu_key(t); cached = _nlu_cached(k) if cached: plans[k] = cached else: todo.setdefault(k, t) if todo: try: body = "Plan actions for each line:\n" + "\n".join(f"{i}) {t}" for i, t in enumerate(todo.values(), 1)) messages = [ {"role":"system","content": BATCH_PROMPT}, {"role":"user","content": body}, ] async with _NLU_SEM: resp = await _openai_client.chat.completions.create( model="gpt-4o-mini", messages=messages, temperature=0.2, response_format={"type":"json_object"} ) answers = _loads(resp.choices[0].message.content).get("plans") or [] for k, p in zip(todo, answers): if isinstance(p, dict): plans[k] = {"reply": p.get("reply") or "", "action": p.get("action")} if p.get("action") is None or isinstance(p["action"], dict): _nlu_remember(k, plans[k]) except Exception as e: logging.warning(f"NLU batch error: {e}") return [plans.get(_nlu_key(t)) for t in texts]
+
+---------- Voice: hotkey to start listening (vosk / faster-whisper)
+
+class PcmRing: def init(self, size=16000 * 5): self.buf = np.zeros(size, dtype=np.int16) self.size = size self.w = 0 self.r = 0 self.ready = threading.Event() def write(self, indata): x = np.frombuffer(indata, dtype=np.int16) n = len(x); i = self.w % self.size; k = min(n, self.size - i) self.buf[i:i + k] = x[:k] self.buf[:n - k] = x[k:] self.w += n self.ready.set() def read(self, timeout=None): if not self.ready.wait(timeout): return b"" self.ready.clear() w = self.w; r = max(self.r, w - self.size); n = w - r self.r = w if not n: return b"" i = r % self.size if i + n <= self.size: return self.buf[i:i + n].tobytes() return np.concatenate((self.buf[i:], self.buf[:i + n - self.size])).tobytes()
+
+class VoskListener(threading.Thread): MODEL_ENV = "ASSISTANT_VOSK_MODEL" DEFAULT_MODEL = "vosk-model-small-en-us-0.15" def init(self, wake_word="hey atlas", model_size=None): super().init(daemon=True) self.wake = wake_word.lower() self.model_size = model_size or os.getenv(self.MODEL_ENV) or self.DEFAULT_MODEL self.active = False def run(self): if not vosk or not sd or not np: logging.info("Vosk not available; voice disabled") return try: vosk.SetLogLevel(-1) model = vosk.Model(model_name=self.model_size) ring = PcmRing() def cb(indata, frames, time_, status): ring.write(indata) with sd.RawInputStream(samplerate=16000, blocksize=8000, dtype='int16', channels=1, callback=cb): rec = vosk.KaldiRecognizer(model, 16000) logging.info("Voice listener ready") while not STATE["stop"]: data = ring.read(timeout=1.0) if not data: continue if rec.AcceptWaveform(data): self._on_utterance(_loads(rec.Result()).get("text", "").lower()) except Exception as e: logging.warning(f"Vosk error: {e}") def _on_utterance(self, text): if not text: return if not self.active: if self.wake in text: tts_interrupt() notify(APP_NAME, "Listening...") self.active = True else: handle_user_text(text) self.active = False
+
+_WORD_RE = re.compile(r"[^\w']+")
+
+def _norm_word(w): return _WORD_RE.sub("", w.lower())
+
+class LocalAgreement: def init(self): self.committed = [] self.pending = [] def insert(self, words): if self.committed: last = self.committed[-1][1] words = [w for w in words if w[0] > last - 0.1] for k in range(min(5, len(self.committed), len(words)), 0, -1): if [_norm_word(w[2]) for w in self.committed[-k:]] == [_norm_word(w[2]) for w in words[:k]]: words = words[k:]; break n = 0 while n < len(words) and n < len(self.pending) and _norm_word(words[n][2]) == _norm_word(self.pending[n][2]): n += 1 self.committed.extend(words[:n]) self.pending = words[n:] return words[:n] def text(self): return "".join(w[2] for w in self.committed + self.pending).strip()
+
+class WhisperListener(VoskListener): MODEL_ENV = "ASSISTANT_WHISPER_MODEL" DEFAULT_MODEL = "small" MIN_CHUNK_S = 1.0 MAX_BUFFER_S = 30.0 TRIM_AFTER_S = 10.0 def run(self): if not WhisperModel or not sd or not np: logging.info("faster-whisper not available; voice disabled") return try: model = WhisperModel(self.model_size, device="cpu", compute_type=os.getenv("ASSISTANT_STT_COMPUTE", "int8"), cpu_threads=_STT_THREADS, num_workers=1) except Exception as e: logging.warning(f"faster-whisper model load failed ({e}); falling back to Vosk") self.model_size = os.getenv(VoskListener.MODEL_ENV) or VoskListener.DEFAULT_MODEL return super().run() try: vad = VadOptions(min_silence_duration_ms=700) ring = PcmRing(int(16000 * self.MAX_BUFFER_S)) def cb(indata, frames, time_, status): ring.write(indata) with sd.RawInputStream(samplerate=16000, blocksize=8000, dtype='int16', channels=1, callback=cb): logging.info("Voice listener ready") audio = np.zeros(0, dtype=np.float32); offset = 0.0; fresh = 0 agree = LocalAgreement() while not STATE["stop"]: data = ring.read(timeout=1.0) if not data: continue chunk = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0 audio = np.concatenate((audio, chunk)); fresh += len(chunk) if fresh < 16000 * self.MIN_CHUNK_S: continue fresh = 0 speech = get_speech_timestamps(audio, vad) if self.active and speech: tts_interrupt() if not speech and not agree.committed and not agree.pending: keep = audio[-8000:]; offset += (len(audio) - len(keep)) / 16000; audio = keep continue segments, _ = model.transcribe(audio, beam_size=1, word_timestamps=True, language="en") agree.insert([(offset + w.start, offset + w.end, w.word) for s in segments for w in (s.words or [])]) if not speech or len(audio) - speech[-1]["end"] >= 16000 * 0.7: self._on_utterance(_WORD_RE.sub(" ", agree.text().lower()).strip()) offset += len(audio) / 16000; audio = np.zeros(0, dtype=np.float32) agree = LocalAgreement() continue cut = None for w in reversed(agree.committed): if w[2].rstrip().endswith((".", "?", "!")) and w[1] - offset > self.TRIM_AFTER_S: cut = w[1]; break if cut is None and len(audio) > 16000 * self.MAX_BUFFER_S: cut = max(agree.committed[-1][1] if agree.committed else offset, offset + len(audio) / 16000 - self.MAX_BUFFER_S) if cut is not None and cut > offset: audio = audio[int((cut - offset) * 16000):]; offset = cut except Exception as e: logging.warning(f"Whisper error: {e}")
 
 ---------- Dispatcher
 
-def handle_user_text(user_text: str): db_log("utterance", {"text": user_text}) plan = plan_with_openai(user_text) reply = plan.get("reply") or "" action = plan.get("action") if reply: print(f" ASSISTANT: {reply}") tts_say(reply) if action and isinstance(action, dict): name = action.get("name"); args = action.get("args", {}) fn = ACTIONS.get(name) if fn: try: res = fn(**args) if isinstance(args, dict) else fn(*args) print(f"[action:{name}] {res}") db_log("action", {"name": name, "args": args, "result": str(res)}) except Exception as e: print(f"[action:{name}] error: {e}") else: print(f"unknown action: {name}")
+async def _handle_async(user_text: str, plan=None): db_log("utterance", {"text": user_text}) if plan is None: plan = await plan_with_openai(user_text, on_sentence=tts_say) reply = plan.get("reply") or "" action = plan.get("action") if reply: print(f" ASSISTANT: {reply}") if not plan.get("spoken"): tts_say(reply) if action and isinstance(action, dict): name = action.get("name"); args = action.get("args", {}) fn = ACTIONS.get(name) if fn: try: res = await asyncio.wrap_future(submit(fn, **args) if isinstance(args, dict) else submit(fn, *args)) print(f"[action:{name}] {res}") db_log("action", {"name": name, "args": args, "result": str(res)}) except Exception as e: print(f"[action:{name}] error: {e}") else: print(f"unknown action: {name}")
+
+def handle_user_text(user_text: str): return asyncio.run_coroutine_threadsafe(_handle_async(user_text), _LOOP)
+
+async def _handle_batch_async(texts): plans = await plan_batch_with_openai(texts) for t, plan in zip(texts, plans): await _handle_async(t, plan)
+
+def handle_user_batch(texts): return asyncio.run_coroutine_threadsafe(_handle_batch_async(texts), _LOOP)
 
 ---------- Hotkey (Ctrl+Alt+A) to prompt
 
@@ -185,14 +319,14 @@ def register_hotkey(): if not keyboard: logging.info("keyboard module not instal
 
 ---------- CLI fallback loop
 
-def cli_loop(): print(" Type to chat. Press Ctrl+C to quit. Use hotkey Ctrl+Alt+A anytime.") while not STATE["stop"]: try: user_text = input("you> ").strip() if not user_text: continue if user_text.lower() in ("exit","quit"): break handle_user_text(user_text) except (EOFError, KeyboardInterrupt): break
+def cli_loop(): print(" Type to chat; start a line with '/batch ' to plan several ';'-separated requests at once. Press Ctrl+C to quit. Use hotkey Ctrl+Alt+A anytime.") while not STATE["stop"]: try: user_text = input("you> ").strip() if not user_text: continue if user_text.lower() in ("exit","quit"): break if user_text.lower().startswith("/batch "): texts = [t.strip() for t in user_text[7:].split(";") if t.strip()] if texts: handle_user_batch(texts).result() else: handle_user_text(user_text).result() except (EOFError, KeyboardInterrupt): break
 
 ---------- Main
 
-def main(): db_init() t_sched = threading.Thread(target=scheduler_loop, daemon=True); t_sched.start()
+def main(): db_init() KNOWLEDGE.load() t_sched = threading.Thread(target=scheduler_loop, daemon=True); t_sched.start() t_log = threading.Thread(target=_log_worker, daemon=True); t_log.start() start_workers() threading.Thread(target=_LOOP.run_forever, daemon=True).start() if pyttsx3: threading.Thread(target=_tts_worker, daemon=True).start()
 
-# Start voice listener (wake-word) if available
-VoskListener(os.getenv("ASSISTANT_WAKE_WORD", "hey atlas")).start()
+# Start voice listener (wake-word) if available; prefer faster-whisper over Vosk
+(WhisperListener if WhisperModel else VoskListener)(os.getenv("ASSISTANT_WAKE_WORD", "hey atlas")).start()
 
 # Register global hotkey
 register_hotkey()
@@ -202,16 +336,21 @@ sug = suggest_actions_now()
 if sug:
     print(f"Suggestions for this hour: {', '.join(sug)}")
 
-print(f"{APP_NAME} ready. OpenAI={'on' if _openai_client else 'off'}. Voice={'on' if vosk and sd else 'off'}. Hotkey Ctrl+Alt+A.")
+print(f"{APP_NAME} ready. OpenAI={'on' if _openai_client else 'off'}. Voice={'on' if (WhisperModel or vosk) and sd and np else 'off'}. Hotkey Ctrl+Alt+A.")
 cli_loop()
 
 STATE["stop"] = True
-if STATE["browser"]:
-    try: STATE["browser"].close()
+for obs in list(STATE["watchers"].values()):
+    try: obs.stop()
     except Exception: pass
+with _REM_COND:
+    _REM_COND.notify_all()
 if STATE["playwright"]:
-    try: STATE["playwright"].stop()
+    try: _run_async(close_browser(), timeout=10)
     except Exception: pass
+_LOOP.call_soon_threadsafe(_LOOP.stop)
+_LOG_Q.put(None)
+t_log.join(timeout=2)
 
 if name == "main": main()
 